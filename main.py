@@ -14,22 +14,36 @@ Funcionalidades:
 """
 
 from collections import deque, defaultdict
-from dataclasses import dataclass, field
-from typing import List, Dict, Any, Optional
+from contextlib import contextmanager
+from dataclasses import dataclass, field, fields
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 import datetime
+import heapq
 import json
-import uuid
+import sys
+import time
+
+try:
+    import orjson  # opcional: serializador em C, usado por salvar_json se instalado
+except ImportError:
+    orjson = None
+
+# slots=True só existe a partir do Python 3.10; em versões antigas fica sem slots
+_DC_SLOTS = {'slots': True} if sys.version_info >= (3, 10) else {}
+
+# Ordem de atendimento das prioridades (menor = mais urgente)
+_PRIO = {'alta': 0, 'media': 1, 'baixa': 2}
 
 # ------------------------------
 # Modelos de dados simples
 # ------------------------------
-@dataclass
+@dataclass(**_DC_SLOTS)
 class Doador:
     id: str
     nome: str
     contato: str
 
-@dataclass
+@dataclass(**_DC_SLOTS)
 class ItemDoacao:
     id: str
     nome: str
@@ -37,7 +51,7 @@ class ItemDoacao:
     quantidade: int
     data: str  # ISO string
 
-@dataclass
+@dataclass(**_DC_SLOTS)
 class Pedido:
     id: str
     solicitante: str
@@ -46,48 +60,113 @@ class Pedido:
     prioridade: str  # 'alta', 'media', 'baixa'
     data: str
     atendido: bool = False
+    prio_rank: int = field(init=False, repr=False)  # derivado de prioridade
 
-@dataclass
+    def __post_init__(self):
+        # prioridade desconhecida conta como baixa
+        self.prio_rank = _PRIO.get(self.prioridade, 2)
+
+@dataclass(**_DC_SLOTS)
 class Alocacao:
     id: str
     item_id: str
     pedido_id: str
     quantidade: int
     data: str
+    categoria: str  # categoria, nome e data de doação do item, para o desfazer devolver ao lugar certo
+    nome: str
+    data_item: str
+
+def _gerar_to_dict(cls):
+    """Gera um serializador específico da classe: leituras diretas de atributo, sem reflexão por instância."""
+    # só campos do __init__: os derivados (init=False) são recalculados ao reconstruir
+    corpo = ', '.join(f"{f.name!r}: o.{f.name}" for f in fields(cls) if f.init)
+    ns: Dict[str, Any] = {}
+    exec(f"def to_dict(o):\n    return {{{corpo}}}\n", ns)
+    return ns['to_dict']
+
+# Alocacao fica de fora: o histórico guarda tuplas, serializadas via _ALOC_CAMPOS
+for _cls in (Doador, ItemDoacao, Pedido):
+    _cls._to_dict = staticmethod(_gerar_to_dict(_cls))
+
+# O histórico guarda alocações como tuplas na ordem dos campos de Alocacao
+# (id, item_id, pedido_id, quantidade, data, categoria, nome, data_item): mais barato que instanciar a dataclass.
+_ALOC_CAMPOS = tuple(f.name for f in fields(Alocacao))
+
+# ------------------------------
+# Serialização incremental (salvar_json)
+# ------------------------------
+def _dumps(obj: Any) -> str:
+    if orjson is not None:
+        return orjson.dumps(obj).decode('utf-8')
+    return json.dumps(obj, ensure_ascii=False)
+
+def _escrever_lista(f, registros, recuo: str):
+    """Escreve uma lista JSON registro a registro, sem materializar a lista inteira."""
+    f.write('[')
+    vazio = True
+    for r in registros:
+        f.write(('\n' if vazio else ',\n') + recuo + '  ' + _dumps(r))
+        vazio = False
+    f.write(']' if vazio else '\n' + recuo + ']')
 
 # ------------------------------
 # Estruturas do sistema
 # ------------------------------
 
 class SistemaDoacoes:
-    def __init__(self):
+    def __init__(self, max_undo: int = 1024, verbose: bool = False):
         # Hash table de doadores: id -> Doador
         self.doadores: Dict[str, Doador] = {}
-        # Estoque por categoria (hash table): categoria -> list[ItemDoacao]
-        self.estoque: Dict[str, List[ItemDoacao]] = defaultdict(list)
-        # Filas de pedidos por prioridade (alta, media, baixa)
-        self.fila_alta = deque()
-        self.fila_media = deque()
-        self.fila_baixa = deque()
+        # Estoque por categoria (hash table): categoria -> deque[ItemDoacao] (FIFO por doação)
+        self.estoque: Dict[str, deque] = defaultdict(deque)
+        # Fila de prioridade por categoria (heapq): categoria -> [(prio, seq, pedido_id)]
+        self._por_categoria: Dict[str, List[Tuple[int, int, str]]] = defaultdict(list)
+        # seq garante FIFO entre pedidos de mesma prioridade
+        self._seq = 0
+        # seq decrescente para reinserir pedidos no início da sua prioridade (desfazer)
+        self._seq_frente = 0
         # Map id -> Pedido
         self.pedidos: Dict[str, Pedido] = {}
-        # Pilha de alocações para desfazer
-        self.historico_alocacoes: List[Alocacao] = []
-        # Log simples
+        # Pilha de alocações para desfazer (limitada às últimas max_undo); entradas no layout de _ALOC_CAMPOS
+        self.historico_alocacoes: deque = deque(maxlen=max_undo)
+        # Log simples; só imprime na hora se verbose, senão fica no buffer até flush_logs()
         self.logs: List[str] = []
+        self._verbose = verbose
+        self._logs_impressos = 0
+        # cache do timestamp formatado (recalculado só quando o segundo muda)
+        self._ts_segundo = -1
+        self._ts_str = ''
+        # contador para ids (únicos dentro do processo)
+        self._id_counter = 0
+        # categorias com matching adiado durante bulk_load() (None = matching imediato)
+        self._adiadas: Optional[Dict[str, None]] = None
 
     # ---------- utilitários ----------
     def _now(self):
-        return datetime.datetime.now().isoformat(timespec='seconds')
+        seg = int(time.time())
+        if seg != self._ts_segundo:
+            self._ts_segundo = seg
+            self._ts_str = datetime.datetime.fromtimestamp(seg).isoformat(timespec='seconds')
+        return self._ts_str
 
     def _novo_id(self):
-        return str(uuid.uuid4())[:8]
+        self._id_counter += 1
+        return format(self._id_counter, '08x')
 
-    def log(self, texto: str):
-        ts = self._now()
-        entry = f"[{ts}] {texto}"
+    def log(self, texto: str, ts: Optional[str]=None):
+        entry = f"[{ts or self._now()}] {texto}"
         self.logs.append(entry)
-        print(entry)
+        if self._verbose:
+            print(entry)
+            self._logs_impressos = len(self.logs)
+
+    def flush_logs(self):
+        """Escreve de uma vez no stdout as entradas de log ainda não impressas."""
+        pendentes = self.logs[self._logs_impressos:]
+        if pendentes:
+            sys.stdout.write("\n".join(pendentes) + "\n")
+            self._logs_impressos = len(self.logs)
 
     # ---------- doadores ----------
     def cadastrar_doador(self, nome: str, contato: str) -> Doador:
@@ -99,131 +178,133 @@ class SistemaDoacoes:
 
     # ---------- doações ----------
     def registrar_doacao(self, nome_item: str, categoria: str, quantidade: int, doador_id: Optional[str]=None) -> ItemDoacao:
+        # strings internadas: as buscas em estoque/filas viram comparação por identidade
+        categoria = sys.intern(categoria)
         id_ = self._novo_id()
-        item = ItemDoacao(id=id_, nome=nome_item, categoria=categoria, quantidade=quantidade, data=self._now())
+        agora = self._now()
+        item = ItemDoacao(id=id_, nome=nome_item, categoria=categoria, quantidade=quantidade, data=agora)
         self.estoque[categoria].append(item)
-        self.log(f"Doação registrada: {item} (doador={doador_id})")
-        # após inserir no estoque, tenta alocar para pedidos pendentes dessa categoria
-        self._tentar_alocar_para_pedidos(categoria)
+        self.log(f"Doação registrada: {item} (doador={doador_id})", agora)
+        # após inserir no estoque, tenta alocar se houver pedidos pendentes dessa categoria
+        if self._por_categoria.get(categoria):
+            self._agendar_alocacao(categoria)
         return item
 
     # ---------- pedidos ----------
     def cadastrar_pedido(self, solicitante: str, categoria: str, quantidade: int, prioridade: str='media') -> Pedido:
+        categoria = sys.intern(categoria)
+        prioridade = sys.intern(prioridade)
         id_ = self._novo_id()
-        pedido = Pedido(id=id_, solicitante=solicitante, categoria=categoria, quantidade=quantidade, prioridade=prioridade, data=self._now())
+        agora = self._now()
+        pedido = Pedido(id=id_, solicitante=solicitante, categoria=categoria, quantidade=quantidade, prioridade=prioridade, data=agora)
         self.pedidos[id_] = pedido
-        # inserir na fila adequada
-        if prioridade == 'alta':
-            self.fila_alta.append(id_)
-        elif prioridade == 'media':
-            self.fila_media.append(id_)
-        else:
-            self.fila_baixa.append(id_)
-        self.log(f"Pedido cadastrado: {pedido}")
+        # inserir na fila da categoria, ordenada por prio_rank
+        heapq.heappush(self._por_categoria[categoria], (pedido.prio_rank, self._seq, id_))
+        self._seq += 1
+        self.log(f"Pedido cadastrado: {pedido}", agora)
         # tentar alocar imediatamente se estoque tiver itens
-        self._tentar_alocar_para_pedidos(categoria)
+        if self.estoque.get(categoria):
+            self._agendar_alocacao(categoria)
         return pedido
 
+    # ---------- carga em lote ----------
+    @contextmanager
+    def bulk_load(self):
+        """
+        Adia o matching enquanto o bloco registra doações/pedidos em lote.
+        Ao sair, faz uma única passada de alocação por categoria tocada -- também se o
+        bloco levantar exceção, já que as inserções feitas até ali permanecem no sistema.
+        """
+        if self._adiadas is not None:
+            # bulk_load aninhado: a passada fica para o bloco externo
+            yield self._adiadas
+            return
+        tocadas: Dict[str, None] = {}
+        self._adiadas = tocadas
+        try:
+            yield tocadas
+        finally:
+            self._adiadas = None
+            for cat in tocadas:
+                self._tentar_alocar_para_pedidos(cat)
+
     # ---------- alocação (matching) ----------
+    def _agendar_alocacao(self, categoria: str):
+        if self._adiadas is not None:
+            self._adiadas[categoria] = None
+        else:
+            self._tentar_alocar_para_pedidos(categoria)
+
     def _tentar_alocar_para_pedidos(self, categoria: str):
         """
         Tenta alocar estoque disponível dessa categoria para pedidos na ordem de prioridade.
         Repeats until não há estoque suficiente ou não há pedidos.
         """
-        # função local para extrair próxima id de pedido seguindo prioridade
-        def prox_pedido():
-            for fila in (self.fila_alta, self.fila_media, self.fila_baixa):
-                if fila:
-                    return fila[0]  # peek
-            return None
-
-        while True:
-            pedido_id = prox_pedido()
-            if not pedido_id:
-                break
+        # .get para não criar filas/estoques vazios no defaultdict
+        fila = self._por_categoria.get(categoria)
+        itens = self.estoque.get(categoria)
+        if not fila or not itens:
+            return  # nada a casar nessa categoria
+        agora = self._now()  # um timestamp para todas as alocações desta rodada
+        while fila and itens:
+            pedido_id = fila[0][2]  # peek
             pedido = self.pedidos.get(pedido_id)
             if pedido is None or pedido.atendido:
-                # remove se inválido/atendido
-                for fila in (self.fila_alta, self.fila_media, self.fila_baixa):
-                    if fila and fila[0] == pedido_id:
-                        fila.popleft()
+                # remoção preguiçosa de entradas inválidas/atendidas
+                heapq.heappop(fila)
                 continue
-            if pedido.categoria != categoria:
-                # próxima fila pode ter pedido de outra categoria; procurar pedido compatível
-                found = None
-                for fila in (self.fila_alta, self.fila_media, self.fila_baixa):
-                    for pid in list(fila):
-                        p = self.pedidos.get(pid)
-                        if p and not p.atendido and p.categoria == categoria:
-                            found = pid
-                            break
-                    if found:
-                        # bring found to front by rotating
-                        while fila[0] != found:
-                            fila.rotate(-1)
-                        pedido_id = found
-                        pedido = self.pedidos[found]
-                        break
-                if not found:
-                    break  # nenhum pedido dessa categoria
-            # agora temos pedido compatível
-            if not self.estoque[categoria]:
-                break  # sem estoque
-            # retirar do estoque o primeiro item (FIFO por doação)
-            item = self.estoque[categoria][0]
-            alocar_qtd = min(item.quantidade, pedido.quantidade)
-            # registrar alocação
-            aloc = Alocacao(id=self._novo_id(), item_id=item.id, pedido_id=pedido.id, quantidade=alocar_qtd, data=self._now())
-            self.historico_alocacoes.append(aloc)
-            self.log(f"Alocado {alocar_qtd}x '{item.nome}' (categoria {categoria}) -> pedido {pedido.id}")
-            # ajustar quantidades
-            item.quantidade -= alocar_qtd
-            pedido.quantidade -= alocar_qtd
-            if item.quantidade <= 0:
-                # remover item do estoque
-                self.estoque[categoria].pop(0)
-            if pedido.quantidade <= 0:
+            # consumir itens do estoque (FIFO por doação) até atender o pedido ou acabar o estoque;
+            # o saldo do pedido fica numa variável local e só é gravado no fim
+            falta = pedido.quantidade
+            while itens:
+                item = itens[0]
+                disponivel = item.quantidade
+                alocar_qtd = disponivel if disponivel < falta else falta
+                # registrar alocação
+                self.historico_alocacoes.append((self._novo_id(), item.id, pedido_id, alocar_qtd, agora, categoria, item.nome, item.data))
+                self.log(f"Alocado {alocar_qtd}x '{item.nome}' (categoria {categoria}) -> pedido {pedido_id}", agora)
+                # ajustar quantidades
+                item.quantidade = disponivel - alocar_qtd
+                falta -= alocar_qtd
+                if item.quantidade <= 0:
+                    # remover item do estoque
+                    itens.popleft()
+                if falta <= 0:
+                    break
+            pedido.quantidade = falta
+            if falta <= 0:
                 pedido.atendido = True
-                # remover pedido da fila (popleft ou remove)
-                for fila in (self.fila_alta, self.fila_media, self.fila_baixa):
-                    if fila and fila[0] == pedido.id:
-                        fila.popleft()
-                        break
-                    elif pedido.id in fila:
-                        fila.remove(pedido.id)
-                        break
+                # pedido atendido está no topo da fila
+                heapq.heappop(fila)
             # continuar loop para tentar atender mais pedidos dessa categoria
+        if not fila:
+            # fila esgotada: sai do índice, que só guarda categorias com pedidos pendentes
+            del self._por_categoria[categoria]
 
     # ---------- desfazer última alocação ----------
     def desfazer_ultima_alocacao(self) -> bool:
         if not self.historico_alocacoes:
             self.log("Nenhuma alocação para desfazer.")
             return False
-        aloc = self.historico_alocacoes.pop()
-        # devolver quantidade ao estoque (achar categoria pelo item id)
-        # procurar item original (pode ter sido removido se quantidade vir a zero) -> recriar se necessário
-        # Simplicidade: registramos item_id -> categoria por varredura nas entradas de estoque históricas (não persistente)
-        # Para esta versão básica, vamos recriar um item de reposição simples
-        # (em implementação real, manter histórico de itens).
-        # Recriar item simples:
-        item_recriado = ItemDoacao(id=aloc.item_id, nome=f"Item_recuperado_{aloc.item_id}", categoria="Desconhecido", quantidade=aloc.quantidade, data=self._now())
+        aloc_id, item_id, pedido_id, quantidade, _, categoria, nome, data_item = self.historico_alocacoes.pop()
         # regressar pedido para não-atendido (a menos que pedido original exista e ainda tenha qtd)
-        pedido = self.pedidos.get(aloc.pedido_id)
+        pedido = self.pedidos.get(pedido_id)
         if pedido:
             # se já estava marcado atendido, revogamos o atendimento e reinserimos na fila conforme prioridade
             if pedido.atendido:
                 pedido.atendido = False
                 # reinserir no início da fila de sua prioridade
-                if pedido.prioridade == 'alta':
-                    self.fila_alta.appendleft(pedido.id)
-                elif pedido.prioridade == 'media':
-                    self.fila_media.appendleft(pedido.id)
-                else:
-                    self.fila_baixa.appendleft(pedido.id)
-            pedido.quantidade += aloc.quantidade
-        # adicionar de volta ao estoque em categoria "Desconhecido" (simplificação)
-        self.estoque[item_recriado.categoria].append(item_recriado)
-        self.log(f"Desfeita alocação {aloc.id} -> devolvido {aloc.quantidade} ao estoque (categoria 'Desconhecido').")
+                self._seq_frente -= 1
+                heapq.heappush(self._por_categoria[pedido.categoria], (pedido.prio_rank, self._seq_frente, pedido.id))
+            pedido.quantidade += quantidade
+        # devolver quantidade ao início do estoque da categoria original:
+        # se o item ainda não foi esgotado ele é o primeiro da fila (FIFO), senão recriamos
+        itens = self.estoque[categoria]
+        if itens and itens[0].id == item_id:
+            itens[0].quantidade += quantidade
+        else:
+            itens.appendleft(ItemDoacao(id=item_id, nome=nome, categoria=categoria, quantidade=quantidade, data=data_item))
+        self.log(f"Desfeita alocação {aloc_id} -> devolvido {quantidade}x '{nome}' ao estoque (categoria {categoria}).")
         return True
 
     # ---------- consultas / relatórios ----------
@@ -233,6 +314,12 @@ class SistemaDoacoes:
             resumo[cat] = [{'id': it.id, 'nome': it.nome, 'qtd': it.quantidade, 'data': it.data} for it in itens]
         return resumo
 
+    def iter_estoque(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Versão preguiçosa de ver_estoque: gera (categoria, resumo_item) sem montar tudo em memória."""
+        for cat, itens in self.estoque.items():
+            for it in itens:
+                yield cat, {'id': it.id, 'nome': it.nome, 'qtd': it.quantidade, 'data': it.data}
+
     def listar_doadores(self) -> List[Dict[str, str]]:
         return [{'id': d.id, 'nome': d.nome, 'contato': d.contato} for d in self.doadores.values()]
 
@@ -243,19 +330,28 @@ class SistemaDoacoes:
         return res
 
     def listar_historico(self) -> List[Dict[str, Any]]:
-        return [{'id': a.id, 'item_id': a.item_id, 'pedido_id': a.pedido_id, 'qtd': a.quantidade, 'data': a.data} for a in self.historico_alocacoes]
+        return [{'id': a[0], 'item_id': a[1], 'pedido_id': a[2], 'qtd': a[3], 'data': a[4]} for a in self.historico_alocacoes]
 
     # ---------- persistência básica (opcional) ----------
     def salvar_json(self, caminho: str):
-        obj = {
-            'doadores': [d.__dict__ for d in self.doadores.values()],
-            'estoque': {cat: [it.__dict__ for it in itens] for cat, itens in self.estoque.items()},
-            'pedidos': [p.__dict__ for p in self.pedidos.values()],
-            'historico': [a.__dict__ for a in self.historico_alocacoes],
-            'logs': self.logs
-        }
+        # grava seção por seção para não duplicar todo o estado em memória
         with open(caminho, 'w', encoding='utf-8') as f:
-            json.dump(obj, f, indent=2, ensure_ascii=False)
+            f.write('{\n  "doadores": ')
+            _escrever_lista(f, map(Doador._to_dict, self.doadores.values()), '  ')
+            f.write(',\n  "estoque": {')
+            vazio = True
+            for cat, itens in self.estoque.items():
+                f.write(('\n' if vazio else ',\n') + '    ' + _dumps(cat) + ': ')
+                _escrever_lista(f, map(ItemDoacao._to_dict, itens), '    ')
+                vazio = False
+            f.write('}' if vazio else '\n  }')
+            f.write(',\n  "pedidos": ')
+            _escrever_lista(f, map(Pedido._to_dict, self.pedidos.values()), '  ')
+            f.write(',\n  "historico": ')
+            _escrever_lista(f, (dict(zip(_ALOC_CAMPOS, a)) for a in self.historico_alocacoes), '  ')
+            f.write(',\n  "logs": ')
+            _escrever_lista(f, self.logs, '  ')
+            f.write('\n}\n')
         self.log(f"Dados salvos em {caminho}")
 
     def carregar_json(self, caminho: str):
@@ -268,15 +364,16 @@ class SistemaDoacoes:
 # CLI simples
 # ------------------------------
 def menu():
-    s = SistemaDoacoes()
+    s = SistemaDoacoes(verbose=True)
     # dados de exemplo
-    d1 = s.cadastrar_doador("Maria Silva", "maria@ex.com / (81)90000-0001")
-    d2 = s.cadastrar_doador("João Pereira", "joao@ex.com / (81)90000-0002")
-    s.registrar_doacao("Cesta básica pequena", "Alimentos", 10, d1.id)
-    s.registrar_doacao("Agasalho adulto", "Roupas", 5, d2.id)
-    s.registrar_doacao("Máscaras", "Higiene", 50, d2.id)
-    s.cadastrar_pedido("Família A", "Alimentos", 3, prioridade='alta')
-    s.cadastrar_pedido("Abrigo X", "Roupas", 4, prioridade='media')
+    with s.bulk_load():
+        d1 = s.cadastrar_doador("Maria Silva", "maria@ex.com / (81)90000-0001")
+        d2 = s.cadastrar_doador("João Pereira", "joao@ex.com / (81)90000-0002")
+        s.registrar_doacao("Cesta básica pequena", "Alimentos", 10, d1.id)
+        s.registrar_doacao("Agasalho adulto", "Roupas", 5, d2.id)
+        s.registrar_doacao("Máscaras", "Higiene", 50, d2.id)
+        s.cadastrar_pedido("Família A", "Alimentos", 3, prioridade='alta')
+        s.cadastrar_pedido("Abrigo X", "Roupas", 4, prioridade='media')
 
     while True:
         print("\n=== SISTEMA DE DOAÇÕES ===")
@@ -1,9 +1,15 @@
+import io
+import json
+import os
+import tempfile
 import unittest
-from main import SistemaDoacoes
+from contextlib import redirect_stdout
+from unittest import mock
+from main import SistemaDoacoes, Pedido
 
 class TestSistemaDoacoes(unittest.TestCase):
     def setUp(self):
-        self.s = SistemaDoacoes()
+        self.s = SistemaDoacoes(verbose=False)
         # criar doadores e doações iniciais
         self.d1 = self.s.cadastrar_doador("Teste Doador", "contato")
         self.i1 = self.s.registrar_doacao("Arroz", "Alimentos", 5, self.d1.id)
@@ -21,6 +27,11 @@ class TestSistemaDoacoes(unittest.TestCase):
         total_qtd = sum(it['qtd'] for it in estoque['Alimentos'])
         self.assertEqual(total_qtd, 8)
 
+    def test_iter_estoque(self):
+        estoque = self.s.ver_estoque()
+        esperado = [(cat, it) for cat, itens in estoque.items() for it in itens]
+        self.assertEqual(list(self.s.iter_estoque()), esperado)
+
     def test_pedido_atendido_automatico(self):
         # após setUp, cadastro do pedido deve ter desencadeado alocação
         pedido = self.s.pedidos[self.p1.id]
@@ -36,5 +47,143 @@ class TestSistemaDoacoes(unittest.TestCase):
         result = self.s.desfazer_ultima_alocacao()
         self.assertTrue(result)
 
+    def test_prio_rank_derivado(self):
+        p = Pedido(id="x", solicitante="S", categoria="Roupas", quantidade=1, prioridade='alta', data="")
+        self.assertEqual(p.prio_rank, 0)
+        self.assertNotIn("prio_rank", repr(p))
+        self.assertEqual(self.s.cadastrar_pedido("S", "Roupas", 1, prioridade='urgente').prio_rank, 2)
+
+    def test_prioridade_dentro_da_categoria(self):
+        s = SistemaDoacoes(verbose=False)
+        baixa = s.cadastrar_pedido("B", "Roupas", 2, prioridade='baixa')
+        media = s.cadastrar_pedido("M", "Roupas", 2, prioridade='media')
+        outra = s.cadastrar_pedido("O", "Higiene", 2, prioridade='alta')
+        alta = s.cadastrar_pedido("A", "Roupas", 2, prioridade='alta')
+        s.registrar_doacao("Camisa", "Roupas", 3)
+        self.assertEqual([a['pedido_id'] for a in s.listar_historico()], [alta.id, media.id])
+        self.assertTrue(alta.atendido)
+        self.assertEqual(media.quantidade, 1)
+        self.assertEqual(baixa.quantidade, 2)
+        self.assertEqual(outra.quantidade, 2)
+        # pedido atendido sai da fila; desfazer devolve ele ao início da sua prioridade
+        s.registrar_doacao("Calça", "Roupas", 1)
+        self.assertTrue(media.atendido)
+        s.desfazer_ultima_alocacao()
+        s.desfazer_ultima_alocacao()
+        s.desfazer_ultima_alocacao()
+        self.assertFalse(alta.atendido)
+        n = len(s.historico_alocacoes)
+        s.registrar_doacao("Casaco", "Roupas", 2)
+        self.assertEqual(s.listar_historico()[n]['pedido_id'], alta.id)
+
+    def test_bulk_load_adia_alocacao(self):
+        s = SistemaDoacoes(verbose=False)
+        with s.bulk_load() as tocadas:
+            p = s.cadastrar_pedido("Fam", "Roupas", 3)
+            s.registrar_doacao("Camisa", "Roupas", 2)
+            s.registrar_doacao("Calça", "Roupas", 2)
+            self.assertEqual(list(tocadas), ["Roupas"])
+            self.assertEqual(len(s.historico_alocacoes), 0)
+        self.assertTrue(p.atendido)
+        self.assertEqual(len(s.historico_alocacoes), 2)
+
+    def test_bulk_load_aninhado(self):
+        s = SistemaDoacoes(verbose=False)
+        with s.bulk_load() as externas:
+            p = s.cadastrar_pedido("Fam", "Roupas", 2)
+            with s.bulk_load() as internas:
+                self.assertIs(internas, externas)
+                s.registrar_doacao("Camisa", "Roupas", 5)
+            # o bloco interno não faz a passada; ela fica para o externo
+            self.assertEqual(len(s.historico_alocacoes), 0)
+        self.assertTrue(p.atendido)
+
+    def test_bulk_load_com_excecao(self):
+        s = SistemaDoacoes(verbose=False)
+        with self.assertRaises(ValueError):
+            with s.bulk_load():
+                p = s.cadastrar_pedido("Fam", "Roupas", 2)
+                s.registrar_doacao("Camisa", "Roupas", 5)
+                raise ValueError("falha no meio da carga")
+        # o que entrou antes da exceção é casado na saída
+        self.assertTrue(p.atendido)
+        self.assertEqual(s.ver_estoque()['Roupas'][0]['qtd'], 3)
+        # e o sistema volta ao matching imediato
+        p2 = s.cadastrar_pedido("Fam B", "Roupas", 1)
+        self.assertTrue(p2.atendido)
+
+    def test_desfazer_devolve_categoria_original(self):
+        # setUp alocou 4 de 'Arroz' (5) para o pedido de 4
+        self.assertTrue(self.s.desfazer_ultima_alocacao())
+        estoque = self.s.ver_estoque()
+        self.assertNotIn("Desconhecido", estoque)
+        self.assertEqual(sum(it['qtd'] for it in estoque['Alimentos']), 8)
+        self.assertEqual(estoque['Alimentos'][0]['nome'], "Arroz")
+        self.assertEqual(estoque['Alimentos'][0]['data'], self.i1.data)
+        pedido = self.s.pedidos[self.p1.id]
+        self.assertFalse(pedido.atendido)
+        self.assertEqual(pedido.quantidade, 4)
+
+    def test_desfazer_recria_item_com_data_original(self):
+        s = SistemaDoacoes(verbose=False)
+        s._now = lambda: "2020-01-01T00:00:00"
+        item = s.registrar_doacao("Camisa", "Roupas", 2)
+        del s._now
+        s.cadastrar_pedido("Fam", "Roupas", 2)
+        self.assertFalse(s.estoque.get("Roupas"))  # item esgotado
+        s.desfazer_ultima_alocacao()
+        recriado = s.ver_estoque()['Roupas'][0]
+        self.assertEqual((recriado['id'], recriado['nome'], recriado['qtd']), (item.id, "Camisa", 2))
+        self.assertEqual(recriado['data'], "2020-01-01T00:00:00")
+
+    def test_logs_em_buffer(self):
+        saida = io.StringIO()
+        with redirect_stdout(saida):
+            self.s.cadastrar_doador("Outro", "contato")
+            self.assertEqual(saida.getvalue(), "")
+            self.s.flush_logs()
+        self.assertEqual(saida.getvalue().splitlines(), self.s.logs)
+
+    def test_salvar_json(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            caminho = os.path.join(tmp, "dados.json")
+            self.s.salvar_json(caminho)
+            with open(caminho, encoding='utf-8') as f:
+                obj = json.load(f)
+        self.assertEqual(obj['doadores'][0]['nome'], "Teste Doador")
+        self.assertEqual([it['nome'] for it in obj['estoque']['Alimentos']], ["Arroz", "Feijão"])
+        self.assertEqual(obj['pedidos'][0]['id'], self.p1.id)
+        self.assertEqual(len(obj['historico']), len(self.s.historico_alocacoes))
+        self.assertEqual(obj['logs'], self.s.logs[:-1])  # a última linha é o log do próprio salvamento
+
+    def test_salvar_json_sem_orjson(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            padrao = os.path.join(tmp, "padrao.json")
+            fallback = os.path.join(tmp, "fallback.json")
+            self.s.salvar_json(padrao)
+            with mock.patch('main.orjson', None):
+                self.s.salvar_json(fallback)
+            with open(padrao, encoding='utf-8') as f:
+                obj_padrao = json.load(f)
+            with open(fallback, encoding='utf-8') as f:
+                texto = f.read()
+        self.assertIn("Feijão", texto)  # json.dumps com ensure_ascii=False
+        obj = json.loads(texto)
+        self.assertEqual(obj['logs'], self.s.logs[:-1])
+        # mesmo documento, exceto pela linha de log do primeiro salvamento
+        self.assertEqual(obj['logs'][:-1], obj_padrao['logs'])
+        del obj['logs'], obj_padrao['logs']
+        self.assertEqual(obj, obj_padrao)
+
+    def test_historico_limitado(self):
+        s = SistemaDoacoes(max_undo=2, verbose=False)
+        for _ in range(4):
+            s.cadastrar_pedido("Fam", "Roupas", 1)
+        s.registrar_doacao("Camisa", "Roupas", 4)
+        self.assertEqual(len(s.historico_alocacoes), 2)
+        self.assertTrue(s.desfazer_ultima_alocacao())
+        self.assertTrue(s.desfazer_ultima_alocacao())
+        self.assertFalse(s.desfazer_ultima_alocacao())
+
 if __name__ == '__main__':
     unittest.main()